@@ -1,14 +1,121 @@
-import msal
-import requests
+import functools
+import hashlib
+import logging
+import mmap
 import os
+import re
 import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
+
+log = logging.getLogger(__name__)
+
+# Third-party imports are deferred to first use so that `--help` and
+# configuration errors don't pay for msal/requests/httpx/asyncio start-up.
+if TYPE_CHECKING:
+    import httpx
+    import msal
+    import requests
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+# The runtime environment doesn't change while the process is alive, so
+# detect it once at import instead of stat()-ing on every OneNoteAuth().
+_IS_CONTAINER = os.path.exists("/.dockerenv") or os.path.exists("/run/.containerenv")
+_DOCKER_SECRETS_AVAILABLE = Path("/run/secrets").exists()
+_DOCKER_TOKEN_PATH = Path("/run/secrets/ms_refresh_token")
+
+# Only MS_CLIENT_ID is ever read from .env, so scan for that line directly
+_MS_CLIENT_ID_RE = re.compile(rb"^MS_CLIENT_ID=(.+)$", re.MULTILINE)
+
+# Banner separator for user-facing console output
+_SEP = "=" * 60
+
+# Re-acquire access tokens this many seconds before they actually expire
+TOKEN_EXPIRY_MARGIN = 60
+
+# Background worker for prefetch_token(); threads start on first submit
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="onenote-auth")
+
+# Graph JSON batching accepts at most 20 subrequests per call
+BATCH_SIZE = 20
+# Subrequests Graph throttles inside a $batch; only these are resent
+_BATCH_RETRY_STATUSES = frozenset({429, 503})
+BATCH_MAX_RETRIES = 5
+
+
+def _sections_batch(notebook_ids: List[str]) -> Dict[str, Any]:
+    """$batch body listing the sections of each notebook, ids = list index"""
+    return {
+        "requests": [
+            {
+                "id": str(i),
+                "method": "GET",
+                "url": f"/me/onenote/notebooks/{nb_id}/sections",
+            }
+            for i, nb_id in enumerate(notebook_ids)
+        ]
+    }
+
+
+def _retry_after(item: Dict[str, Any], attempt: int) -> float:
+    """Seconds to wait before resending a throttled subrequest"""
+    headers = {k.lower(): v for k, v in (item.get("headers") or {}).items()}
+    try:
+        return float(headers["retry-after"])
+    except (KeyError, ValueError):
+        return float(2**attempt)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_token_cache(cache_path: str) -> "msal.SerializableTokenCache":
+    """Open the file-backed MSAL token cache (one instance per file)"""
+    from token_store import FileTokenCache
+
+    return FileTokenCache(Path(cache_path))
+
+
+@functools.lru_cache(maxsize=8)
+def _build_app(
+    client_id: str, tenant_id: str, token_cache: "msal.SerializableTokenCache"
+) -> "msal.PublicClientApplication":
+    """Build (once per client/tenant/cache) the MSAL app, reusing authority discovery"""
+    import msal
+
+    return msal.PublicClientApplication(
+        client_id,
+        authority=f"https://login.microsoftonline.com/{tenant_id}",
+        token_cache=token_cache,
+    )
 
 
 class OneNoteAuth:
+    # No per-instance __dict__: smaller instances and faster attribute access
+    __slots__ = (
+        "is_container",
+        "client_id",
+        "tenant_id",
+        "scope",
+        "token_path",
+        "cache_path",
+        "pool_maxsize",
+        "_app",
+        "_session",
+        "_refresh_token",
+        "_refresh_token_loaded",
+        "_last_saved_token_hash",
+        "_at",
+        "_at_exp",
+        "_auth_header",
+        "_prefetch",
+    )
+
     def __init__(
-        self, token_path: Optional[str] = None, client_id: Optional[str] = None
+        self,
+        token_path: Optional[str] = None,
+        client_id: Optional[str] = None,
+        pool_maxsize: int = 20,
     ):
         """
         Initialize auth handler for both local and container environments.
@@ -21,11 +128,11 @@ class OneNoteAuth:
             client_id: Optional Microsoft Client ID. If None:
                        1. Checks environment variable MS_CLIENT_ID
                        2. Loads from .env file for local dev (if exists)
+            pool_maxsize: Max pooled HTTPS connections to Microsoft Graph.
+                          Raise it for concurrent fetchers sharing this instance.
         """
         # Smart environment detection
-        self.is_container = os.path.exists("/.dockerenv") or os.path.exists(
-            "/run/.containerenv"
-        )
+        self.is_container = _IS_CONTAINER
 
         # Load client_id with fallback
         self.client_id = self._get_client_id(client_id)
@@ -35,12 +142,69 @@ class OneNoteAuth:
 
         # Smart token path resolution
         self.token_path = self._resolve_token_path(token_path)
-
-        self.app = msal.PublicClientApplication(
-            self.client_id,
-            authority=f"https://login.microsoftonline.com/{self.tenant_id}",
+        self.cache_path = self.token_path.with_name(
+            f"{self.token_path.name}_cache.json"
         )
-        self.refresh_token = self._load_refresh_token()
+
+        # Everything below touches disk, network or heavy imports, so it is
+        # deferred until first use (see the properties that follow)
+        self.pool_maxsize = pool_maxsize
+        self._app: Optional["msal.PublicClientApplication"] = None
+        self._session: Optional["requests.Session"] = None
+        self._refresh_token: Optional[str] = None
+        self._refresh_token_loaded = False
+        self._last_saved_token_hash: Optional[bytes] = None
+        self._at: Optional[str] = None
+        self._at_exp = 0.0
+        self._auth_header: Optional[Dict[str, str]] = None
+        self._prefetch: Optional["Future[Optional[str]]"] = None
+
+    @property
+    def cache(self) -> "msal.SerializableTokenCache":
+        """File-backed MSAL token cache, shared by instances using the same file"""
+        return _load_token_cache(str(self.cache_path))
+
+    @property
+    def app(self) -> "msal.PublicClientApplication":
+        """MSAL app, built on first use"""
+        if self._app is None:
+            self._app = _build_app(self.client_id, self.tenant_id, self.cache)
+        return self._app
+
+    @property
+    def refresh_token(self) -> Optional[str]:
+        """Persisted refresh token, read from disk on first use"""
+        if not self._refresh_token_loaded:
+            self._refresh_token = self._load_refresh_token()
+            self._refresh_token_loaded = True
+        return self._refresh_token
+
+    @property
+    def session(self) -> "requests.Session":
+        """One keep-alive connection pool for all Graph calls"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._session = requests.Session()
+            self._session.mount(
+                "https://",
+                HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize),
+            )
+        return self._session
+
+    def close(self) -> None:
+        """Close pooled HTTP connections"""
+        if self._session is not None:
+            self._session.close()
+            # A later call gets a fresh pool instead of the closed one
+            self._session = None
+
+    def __enter__(self) -> "OneNoteAuth":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
     def _get_client_id(self, client_id: Optional[str]) -> str:
         """Get client ID with proper fallback strategy"""
@@ -55,15 +219,9 @@ class OneNoteAuth:
 
         # Priority 3: .env file for local development only
         if not self.is_container:
-            try:
-                from dotenv import load_dotenv
-
-                load_dotenv()
-                env_client_id = os.getenv("MS_CLIENT_ID")
-                if env_client_id:
-                    return env_client_id
-            except ImportError:
-                pass  # dotenv not installed, skip
+            env_client_id = self._read_dotenv_client_id()
+            if env_client_id:
+                return env_client_id
 
         raise ValueError(
             "MS_CLIENT_ID must be set. Options:\n"
@@ -72,15 +230,29 @@ class OneNoteAuth:
             "3. Create .env file for local development (only if not in container)"
         )
 
+    @staticmethod
+    def _read_dotenv_client_id() -> Optional[str]:
+        """Read MS_CLIENT_ID from ./.env without loading the whole file into env"""
+        try:
+            with open(Path.cwd() / ".env", "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mm:
+                match = _MS_CLIENT_ID_RE.search(mm)
+                value = match.group(1) if match else None
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            return None
+        if value is None:
+            return None
+        return value.decode().strip().strip("'\"") or None
+
     def _resolve_token_path(self, token_path: Optional[str]) -> Path:
         """Resolve token storage path based on environment"""
         if token_path:
             return Path(token_path)
 
         # Docker production path
-        docker_path = Path("/run/secrets/ms_refresh_token")
-        if docker_path.parent.exists():
-            return docker_path
+        if _DOCKER_SECRETS_AVAILABLE:
+            return _DOCKER_TOKEN_PATH
 
         # Local development path
         return Path.home() / ".onenote_rag" / "refresh_token"
@@ -94,79 +266,247 @@ class OneNoteAuth:
 
     def _load_refresh_token(self) -> Optional[str]:
         """Load persisted refresh token"""
+        # open() directly instead of exists() + read: one syscall fewer and
+        # no window for the file to vanish in between
         try:
-            if self.token_path.exists():
-                token = self.token_path.read_text().strip()
-                print(f"✓ Loaded refresh token from {self.token_path}")
-                return token if token else None
+            fd = os.open(self.token_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
         except Exception as e:
-            print(f"⚠ Warning: Could not load token from {self.token_path}: {e}")
-        return None
+            log.warning("⚠ Could not load token from %s: %s", self.token_path, e)
+            return None
+        try:
+            chunks = []
+            while chunk := os.read(fd, 64 * 1024):
+                chunks.append(chunk)
+            token = b"".join(chunks).decode().strip()
+        except Exception as e:
+            log.warning("⚠ Could not load token from %s: %s", self.token_path, e)
+            return None
+        finally:
+            os.close(fd)
+
+        log.info("✓ Loaded refresh token from %s", self.token_path)
+        if not token:
+            return None
+        self._last_saved_token_hash = hashlib.sha256(token.encode()).digest()
+        return token
 
     def _save_refresh_token(self, token: str) -> None:
-        """Persist refresh token securely"""
+        """Persist refresh token securely, skipping the write if unchanged"""
+        token_hash = hashlib.sha256(token.encode()).digest()
+        # Reading refresh_token loads (and hashes) the on-disk token if needed
+        if self.refresh_token is not None and token_hash == self._last_saved_token_hash:
+            return
         try:
             self._ensure_token_dir()
-            self.token_path.write_text(token)
-            if os.name != "nt":
-                self.token_path.chmod(0o600)
-            print(f"✓ Saved refresh token to {self.token_path}")
+            from token_store import atomic_write
+
+            atomic_write(self.token_path, token)
+            self._last_saved_token_hash = token_hash
+            self._refresh_token = token
+            log.info("✓ Saved refresh token to %s", self.token_path)
         except Exception as e:
-            print(f"✗ Error saving token to {self.token_path}: {e}")
+            log.error("✗ Error saving token to %s: %s", self.token_path, e)
             raise
 
+    def _on_token_acquired(self, result: Dict[str, Any]) -> str:
+        """Persist what MSAL returned and keep the access token in memory"""
+        if "refresh_token" in result:
+            self._save_refresh_token(result["refresh_token"])
+        access_token: str = result["access_token"]
+        self._at = access_token
+        self._auth_header = {"Authorization": f"Bearer {access_token}"}
+        self._at_exp = time.monotonic() + result.get("expires_in", 3600)
+        return access_token
+
+    def prefetch_token(self) -> None:
+        """Start acquiring an access token in the background.
+
+        Call this ahead of a point where a token will be needed (e.g. while
+        embedding pages) so the network round-trip overlaps with that work;
+        the next get_access_token() picks up the result. Only silent sources
+        are tried here - the device code flow is left to the foreground.
+        """
+        if self._prefetch is None:
+            self._prefetch = _EXECUTOR.submit(self._acquire_token_silently)
+
     def get_access_token(self) -> str:
-        """Get access token using refresh token or initiate device flow"""
+        """Get access token from memory, MSAL cache, refresh token or device flow"""
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is not None:
+            # Wait for it; a token it stored is then picked up (subject to the
+            # usual expiry check) by the in-memory lookup below
+            try:
+                prefetch.result()
+            except Exception as e:
+                log.warning("⚠ Background token prefetch failed: %s", e)
+        return self._acquire_token_silently() or self._acquire_token_by_device_flow()
+
+    def _acquire_token_silently(self) -> Optional[str]:
+        """Try memory, the MSAL cache and the refresh token, cheapest first"""
+        if self._at and time.monotonic() < self._at_exp - TOKEN_EXPIRY_MARGIN:
+            return self._at
+
+        accounts = self.app.get_accounts()
+        if accounts:
+            result = self.app.acquire_token_silent(self.scope, account=accounts[0])
+            if result and "access_token" in result:
+                log.info("✓ Using cached access token")
+                return self._on_token_acquired(result)
+
         if self.refresh_token:
-            print("🔄 Attempting silent token refresh...")
+            log.info("🔄 Attempting silent token refresh...")
             result = self.app.acquire_token_by_refresh_token(
                 self.refresh_token, scopes=self.scope
             )
             if "access_token" in result:
-                print("✓ Token refreshed silently")
-                if "refresh_token" in result:
-                    self._save_refresh_token(result["refresh_token"])
-                return result["access_token"]
-            else:
-                print(
-                    f"⚠ Silent refresh failed: {result.get('error_description', 'Unknown error')}"
-                )
-                print("   Falling back to device code flow...")
+                log.info("✓ Token refreshed silently")
+                return self._on_token_acquired(result)
+            log.warning(
+                "⚠ Silent refresh failed: %s - falling back to device code flow",
+                result.get("error_description", "Unknown error"),
+            )
+        return None
 
-        # Device code flow
+    def _acquire_token_by_device_flow(self) -> str:
+        """Interactive sign-in; prints the code the user has to enter"""
         flow = self.app.initiate_device_flow(scopes=self.scope)
         if "user_code" not in flow:
             raise ValueError(f"Failed to create device flow: {flow}")
 
-        print("\n" + "=" * 60)
-        print("📱 MICROSOFT AUTHENTICATION REQUIRED")
-        print("=" * 60)
-        print(f"1. Open on any device: {flow['verification_uri']}")
-        print(f"2. Enter this code:    {flow['user_code']}")
-        print("=" * 60 + "\n")
+        print(
+            f"\n{_SEP}\n"
+            "📱 MICROSOFT AUTHENTICATION REQUIRED\n"
+            f"{_SEP}\n"
+            f"1. Open on any device: {flow['verification_uri']}\n"
+            f"2. Enter this code:    {flow['user_code']}\n"
+            f"{_SEP}\n"
+        )
 
         result = self.app.acquire_token_by_device_flow(flow)
 
         if "access_token" in result:
-            print("✓ Authentication successful!")
-            if "refresh_token" in result:
-                self._save_refresh_token(result["refresh_token"])
-            return result["access_token"]
+            log.info("✓ Authentication successful!")
+            return self._on_token_acquired(result)
         else:
             error = result.get(
                 "error_description", result.get("error", "Unknown error")
             )
             raise Exception(f"Authentication failed: {error}")
 
+    def _auth_header_for(self, access_token: Optional[str]) -> Dict[str, str]:
+        """Authorization header for a token; reuses the one built on acquisition"""
+        token = access_token or self.get_access_token()
+        if token == self._at and self._auth_header is not None:
+            return self._auth_header
+        return {"Authorization": f"Bearer {token}"}
+
     def get_notebooks(self, access_token: Optional[str] = None) -> Dict[str, Any]:
         """Get OneNote notebooks"""
-        token = access_token or self.get_access_token()
-        resp = requests.get(
-            "https://graph.microsoft.com/v1.0/me/onenote/notebooks",
-            headers={"Authorization": f"Bearer {token}"},
+        import orjson
+
+        resp = self.session.get(
+            f"{GRAPH_URL}/me/onenote/notebooks",
+            headers=self._auth_header_for(access_token),
+            timeout=(5, 30),
         )
         resp.raise_for_status()
-        return resp.json()
+        return orjson.loads(resp.content)
+
+    def get_notebooks_with_sections(
+        self, access_token: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Sync wrapper around get_notebooks_with_sections_async() for scripts/CLI"""
+        import asyncio
+
+        return asyncio.run(self.get_notebooks_with_sections_async(access_token))
+
+    async def get_notebooks_with_sections_async(
+        self, access_token: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get OneNote notebooks, each with a 'sections' list fetched via $batch.
+
+        Use this form from code that already runs an event loop, where the
+        sync wrapper's asyncio.run() would fail.
+        """
+        import asyncio
+        import httpx
+        import orjson
+
+        # MSAL is synchronous (and may run the device flow), so keep it off
+        # the event loop thread
+        token = access_token or await asyncio.to_thread(self.get_access_token)
+        async with httpx.AsyncClient(
+            http2=True,
+            headers=self._auth_header_for(token),
+            timeout=httpx.Timeout(30, connect=5),
+        ) as client:
+            resp = await client.get(f"{GRAPH_URL}/me/onenote/notebooks")
+            resp.raise_for_status()
+            notebooks: List[Dict[str, Any]] = orjson.loads(resp.content).get(
+                "value", []
+            )
+            if notebooks:
+                sections = await self._batch_get_sections(
+                    client, [nb["id"] for nb in notebooks]
+                )
+                for nb in notebooks:
+                    nb["sections"] = sections.get(nb["id"], [])
+        return notebooks
+
+    async def _batch_get_sections(
+        self, client: "httpx.AsyncClient", notebook_ids: List[str]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch sections for many notebooks in as few round-trips as possible"""
+        import asyncio
+        import orjson
+
+        sections: Dict[str, List[Dict[str, Any]]] = {}
+        pending = notebook_ids
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            chunks = [
+                pending[i : i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)
+            ]
+            responses = await asyncio.gather(
+                *(
+                    client.post(f"{GRAPH_URL}/$batch", json=_sections_batch(chunk))
+                    for chunk in chunks
+                )
+            )
+
+            throttled: List[str] = []
+            delay = 0.0
+            for chunk, resp in zip(chunks, responses):
+                resp.raise_for_status()
+                for item in orjson.loads(resp.content)["responses"]:
+                    nb_id = chunk[int(item["id"])]
+                    if item["status"] in _BATCH_RETRY_STATUSES:
+                        throttled.append(nb_id)
+                        delay = max(delay, _retry_after(item, attempt))
+                    elif item["status"] >= 400:
+                        raise Exception(
+                            f"Failed to get sections for notebook {nb_id}: "
+                            f"{item['status']} {item.get('body')}"
+                        )
+                    else:
+                        sections[nb_id] = item["body"].get("value", [])
+
+            if not throttled:
+                return sections
+            pending = throttled
+            if attempt < BATCH_MAX_RETRIES:
+                log.info(
+                    "⏳ %d section request(s) throttled, retrying in %.0fs",
+                    len(pending),
+                    delay,
+                )
+                await asyncio.sleep(delay)
+
+        raise Exception(
+            f"Failed to get sections for {len(pending)} notebook(s): "
+            f"still throttled after {BATCH_MAX_RETRIES} retries"
+        )
 
 
 # Command-line interface
@@ -174,34 +514,72 @@ def main():
     """CLI entry point - works everywhere with the same code"""
     import argparse
 
-    parser = argparse.ArgumentParser(description="OneNote Authentication")
-    parser.add_argument(
-        "--client-id", help="Microsoft Client ID (optional, uses MS_CLIENT_ID env var)"
+    # Show this module's status messages on the CLI without turning on
+    # INFO output of third-party loggers (httpx logs every request)
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+    # Shared options are accepted before or after the subcommand; SUPPRESS
+    # keeps a subcommand's unset option from clobbering the top-level value
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--client-id",
+        default=argparse.SUPPRESS,
+        help="Microsoft Client ID (optional, uses MS_CLIENT_ID env var)",
+    )
+    common.add_argument(
+        "--token-path",
+        default=argparse.SUPPRESS,
+        help="Custom path for refresh token storage",
+    )
+
+    parser = argparse.ArgumentParser(
+        description="OneNote Authentication", parents=[common]
+    )
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.add_parser(
+        "auth", parents=[common], help="Obtain and persist an access token"
+    )
+    commands.add_parser(
+        "list-notebooks",
+        parents=[common],
+        help="Obtain a token and list OneNote notebooks (default)",
     )
-    parser.add_argument("--token-path", help="Custom path for refresh token storage")
 
-    # No API flag - always test
     args = parser.parse_args()
+    client_id = getattr(args, "client_id", None)
+    token_path = getattr(args, "token_path", None)
 
     try:
-        auth = OneNoteAuth(token_path=args.token_path, client_id=args.client_id)
-
-        token = auth.get_access_token()
-
-        print("\n" + "=" * 60)
-        print("✅ ACCESS TOKEN OBTAINED")
-        print("=" * 60)
-        print(f"Token preview: {token[:10]}...{token[-10:]}")
-        print(f"Token saved to: {auth.token_path}")
-        print("=" * 60 + "\n")
-
-        # Always test API
-        print("🔍 Testing OneNote API call...")
-        notebooks_data = auth.get_notebooks(token)
-        notebooks = notebooks_data.get("value", [])
-        print(f"✅ Successfully retrieved {len(notebooks)} notebook(s):\n")
-        for nb in notebooks:
-            print(f"  • {nb['displayName']} (ID: {nb['id']})")
+        with OneNoteAuth(token_path=token_path, client_id=client_id) as auth:
+            token = auth.get_access_token()
+
+            print(
+                f"\n{_SEP}\n"
+                "✅ ACCESS TOKEN OBTAINED\n"
+                f"{_SEP}\n"
+                f"Token preview: {token[:10]}...{token[-10:]}\n"
+                f"Token saved to: {auth.token_path}\n"
+                f"{_SEP}\n"
+            )
+
+            if args.command == "auth":
+                return
+
+            print("🔍 Testing OneNote API call...")
+            notebooks_data = auth.get_notebooks(token)
+            notebooks = notebooks_data.get("value", [])
+            print(f"✅ Successfully retrieved {len(notebooks)} notebook(s):\n")
+            if notebooks:
+                sys.stdout.write(
+                    "\n".join(
+                        f"  • {nb['displayName']} (ID: {nb['id']})" for nb in notebooks
+                    )
+                    + "\n"
+                )
 
     except Exception as e:
         print(f"\n❌ Error: {e}", file=sys.stderr)
@@ -8,7 +8,9 @@ from pathlib import Path
 
 # Add the parent directory to sys.path to allow importing auth
 sys.path.insert(0, str(Path(__file__).parent))
-from auth import OneNoteAuth
+import auth as auth_module
+from auth import OneNoteAuth, _build_app, _load_token_cache
+from token_store import FileTokenCache, atomic_write
 
 # ========== FIXTURE: Consistent MS_CLIENT_ID ==========
 @pytest.fixture
@@ -17,12 +19,45 @@ def mock_env():
     with patch.dict(os.environ, {'MS_CLIENT_ID': 'test-client-id'}):
         yield
 
+
+@pytest.fixture(autouse=True)
+def clear_app_cache():
+    """Drop memoized MSAL apps so patched PublicClientApplication is honored."""
+    _build_app.cache_clear()
+    _load_token_cache.cache_clear()
+    yield
+    _build_app.cache_clear()
+    _load_token_cache.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_auth_logger():
+    """Undo the handler/level main() installs on the 'auth' logger."""
+    import logging
+
+    logger = logging.getLogger('auth')
+    with patch.object(logger, 'handlers', []), \
+            patch.object(logger, 'level', logging.NOTSET):
+        yield
+
+
+@pytest.fixture
+def cached_msal_app(mock_env):
+    """MSAL app mock with a signed-in account and a valid cached access token."""
+    with patch('msal.PublicClientApplication') as mock_app_class:
+        app = mock_app_class.return_value
+        app.get_accounts.return_value = [{'username': 'user@example.com'}]
+        app.acquire_token_silent.return_value = {
+            'access_token': 'cached-access-token', 'expires_in': 3600
+        }
+        yield app
+
 # ========== FIXED TESTS ==========
 
 def test_init_resolves_token_path_home(mock_env):
     """Test that token path defaults to home directory when not in Docker."""
-    # Mock Path.exists to simulate non-Docker environment
-    with patch('pathlib.Path.exists', return_value=False):
+    # Simulate non-Docker environment
+    with patch('auth._DOCKER_SECRETS_AVAILABLE', False):
         # Mock Path.home() to return a Path object, not a string
         mock_home_path = Path('/home/user')
         with patch('pathlib.Path.home', return_value=mock_home_path):
@@ -31,59 +66,76 @@ def test_init_resolves_token_path_home(mock_env):
             assert auth.token_path == expected
 
 
+
 def test_init_resolves_token_path_docker(mock_env):
     """Test that token path uses /run/secrets when in Docker environment."""
-    with patch('pathlib.Path.exists', return_value=True):
+    with patch('auth._DOCKER_SECRETS_AVAILABLE', True):
         auth = OneNoteAuth()
         assert str(auth.token_path) == '/run/secrets/ms_refresh_token'
 
 
-def test_load_refresh_token_success(mock_env):
+def test_load_refresh_token_success(mock_env, tmp_path):
     """Test successfully loading a token from a file."""
     fake_token = "fake-refresh-token-123"
-    # Mock both exists and read_text on the SAME Path instance
-    mock_path = MagicMock(spec=Path)
-    mock_path.exists.return_value = True
-    mock_path.read_text.return_value = fake_token
-    
-    with patch('auth.Path', return_value=mock_path):
-        auth = OneNoteAuth(token_path="/dummy/path")
-        # The load happens in __init__, so check the instance variable
+    token_path = tmp_path / "refresh_token"
+    token_path.write_text(fake_token + "\n")
+
+    with patch('msal.PublicClientApplication'):
+        auth = OneNoteAuth(token_path=str(token_path))
+        # Loaded lazily, on first access of the property
         assert auth.refresh_token == fake_token
-        mock_path.read_text.assert_called_once()
 
 
-def test_load_refresh_token_missing_file(mock_env):
+def test_load_refresh_token_missing_file(mock_env, tmp_path):
     """Test handling a missing token file gracefully."""
-    with patch('pathlib.Path.exists', return_value=False):
-        auth = OneNoteAuth()
+    with patch('msal.PublicClientApplication'):
+        auth = OneNoteAuth(token_path=str(tmp_path / "missing"))
         assert auth.refresh_token is None
 
 
-def test_save_refresh_token(mock_env):
+def test_save_refresh_token(mock_env, tmp_path):
     """Test that saving a token creates dirs and writes file securely."""
-    # Create a mock Path object that tracks method calls
-    mock_path = MagicMock(spec=Path)
-    mock_parent = MagicMock()
-    mock_path.parent = mock_parent
-    # CRITICAL: Make exists() return False to trigger mkdir()
-    mock_parent.exists.return_value = False
+    token_path = tmp_path / "nested" / "refresh_token"
+    with patch('msal.PublicClientApplication'):
+        auth = OneNoteAuth(token_path=str(token_path))
+    test_token = "new-fake-token"
 
-    with patch('auth.Path', return_value=mock_path):
-        auth = OneNoteAuth(token_path="/dummy/path")
-        test_token = "new-fake-token"
+    auth._save_refresh_token(test_token)
 
-        auth._save_refresh_token(test_token)
+    # Directory created, file written atomically (no temp file left behind)
+    assert token_path.read_text() == test_token
+    assert not (tmp_path / "nested" / "refresh_token.tmp").exists()
+    # Verify permissions were set (on non-Windows)
+    if os.name != 'nt':
+        assert oct(token_path.parent.stat().st_mode)[-3:] == '700'
+        assert oct(token_path.stat().st_mode)[-3:] == '600'
+
+
+def test_save_refresh_token_skips_unchanged(mock_env, tmp_path):
+    """Test that re-saving a byte-identical token does not touch the disk."""
+    token_path = tmp_path / "refresh_token"
+    token_path.write_text("same-token")
+    with patch('msal.PublicClientApplication'):
+        auth = OneNoteAuth(token_path=str(token_path))
+
+    with patch('token_store.atomic_write') as mock_write:
+        auth._save_refresh_token("same-token")
+        mock_write.assert_not_called()
+        auth._save_refresh_token("rotated-token")
+        mock_write.assert_called_once_with(token_path, "rotated-token")
+
+
+def test_atomic_write_failure_leaves_no_temp_file(tmp_path):
+    """Test that a failed write removes the temp file and keeps the old content."""
+    token_path = tmp_path / "refresh_token"
+    token_path.write_text("old-token")
+
+    with patch('os.fsync', side_effect=OSError('disk full')):
+        with pytest.raises(OSError, match='disk full'):
+            atomic_write(token_path, "new-token")
 
-        # First, verify exists() was checked
-        mock_parent.exists.assert_called_once()
-        # Now verify mkdir was called
-        mock_parent.mkdir.assert_called_once_with(parents=True, exist_ok=True)
-        # Verify the file was written
-        mock_path.write_text.assert_called_once_with(test_token)
-        # Verify permissions were set (on non-Windows)
-        if os.name != 'nt':
-            mock_path.chmod.assert_called_once_with(0o600)
+    assert token_path.read_text() == "old-token"
+    assert list(tmp_path.iterdir()) == [token_path]
 
 
 def test_token_saved_with_correct_permissions():
@@ -115,12 +167,13 @@ def test_missing_client_id_raises_error():
             OneNoteAuth()
 
 
-@patch('auth.msal.PublicClientApplication')  # Patch the ACTUAL import source
+@patch('msal.PublicClientApplication')  # auth imports msal lazily
 def test_silent_token_refresh_success(mock_app_class, mock_env):
     """Test the happy path: silent refresh succeeds with a cached token."""
     # Setup the mock MSAL app and its successful response
     mock_app_instance = Mock()
     mock_app_class.return_value = mock_app_instance
+    mock_app_instance.get_accounts.return_value = []
     mock_app_instance.acquire_token_by_refresh_token.return_value = {
         'access_token': 'new-access-token-xyz',
         'refresh_token': 'new-refresh-token-abc'
@@ -130,18 +183,19 @@ def test_silent_token_refresh_success(mock_app_class, mock_env):
     with patch.object(OneNoteAuth, '_load_refresh_token', return_value='old-cached-token'):
         auth = OneNoteAuth()
         # Mock the _save_refresh_token method to track if it's called
-        with patch.object(auth, '_save_refresh_token') as mock_save:
+        with patch.object(OneNoteAuth, '_save_refresh_token') as mock_save:
             token = auth.get_access_token()
     
     assert token == 'new-access-token-xyz'
     mock_save.assert_called_once_with('new-refresh-token-abc')
 
 
-@patch('auth.msal.PublicClientApplication')  # Patch the ACTUAL import source
+@patch('msal.PublicClientApplication')  # auth imports msal lazily
 def test_silent_refresh_falls_back_to_device_flow(mock_app_class, mock_env):
     """Test that failed silent refresh triggers device flow."""
     mock_app_instance = Mock()
     mock_app_class.return_value = mock_app_instance
+    mock_app_instance.get_accounts.return_value = []
     
     # 1. First, silent refresh fails
     mock_app_instance.acquire_token_by_refresh_token.return_value = {
@@ -159,7 +213,7 @@ def test_silent_refresh_falls_back_to_device_flow(mock_app_class, mock_env):
     
     with patch.object(OneNoteAuth, '_load_refresh_token', return_value='expired-token'):
         auth = OneNoteAuth()
-        with patch.object(auth, '_save_refresh_token'):
+        with patch.object(OneNoteAuth, '_save_refresh_token'):
             token = auth.get_access_token()
     
     assert token == 'device-flow-access-token'
@@ -167,3 +221,483 @@ def test_silent_refresh_falls_back_to_device_flow(mock_app_class, mock_env):
     mock_app_instance.acquire_token_by_refresh_token.assert_called_once()
     mock_app_instance.initiate_device_flow.assert_called_once()
 
+
+
+@patch('msal.PublicClientApplication')
+def test_app_shared_across_instances(mock_app_class, mock_env):
+    """Test that instances with the same client/tenant reuse one MSAL app."""
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        first = OneNoteAuth()
+        second = OneNoteAuth()
+
+    assert first.app is second.app
+    mock_app_class.assert_called_once()
+
+
+def test_cached_access_token_skips_refresh(cached_msal_app):
+    """Test that a valid token in the MSAL cache is returned without a refresh."""
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value='cached-token'):
+        auth = OneNoteAuth()
+        token = auth.get_access_token()
+
+    assert token == 'cached-access-token'
+    cached_msal_app.acquire_token_by_refresh_token.assert_not_called()
+
+
+def test_token_cache_shared_through_file(mock_env, tmp_path):
+    """Test that the MSAL cache is saved beside the refresh token and re-read by others."""
+    token_path = tmp_path / "refresh_token"
+    with patch('msal.PublicClientApplication'):
+        auth = OneNoteAuth(token_path=str(token_path))
+
+    _add_access_token(auth.cache, 'an-access-token')
+
+    cache_path = tmp_path / "refresh_token_cache.json"
+    assert auth.cache_path == cache_path
+    assert cache_path.exists()
+    if os.name != 'nt':
+        assert oct(cache_path.stat().st_mode)[-3:] == '600'
+
+    # Another process (a fresh cache on the same file) sees the token
+    other = FileTokenCache(cache_path)
+    tokens = list(other.search(other.CredentialType.ACCESS_TOKEN))
+    assert [t['secret'] for t in tokens] == ['an-access-token']
+
+
+@patch('msal.PublicClientApplication')
+def test_get_notebooks_reuses_session(mock_app_class, mock_env):
+    """Test that Graph calls go through the pooled session and it closes on exit."""
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None), \
+            patch('requests.Session.get') as mock_get, \
+            patch('requests.Session.close') as mock_close:
+        mock_get.return_value.content = b'{"value": []}'
+        with OneNoteAuth() as auth:
+            auth.get_notebooks('token-123')
+            auth.get_notebooks('token-123')
+
+    assert mock_get.call_count == 2
+    _, kwargs = mock_get.call_args
+    assert kwargs['headers'] == {'Authorization': 'Bearer token-123'}
+    mock_close.assert_called_once()
+    assert auth._session is None
+
+
+def _fake_graph(notebooks):
+    """httpx.AsyncClient get/post stand-ins for the notebook list and $batch."""
+    import httpx
+
+    async def fake_get(url):
+        return httpx.Response(200, json={'value': notebooks},
+                              request=httpx.Request('GET', url))
+
+    async def fake_post(url, json):
+        body = {'responses': [
+            {'id': req['id'], 'status': 200,
+             'body': {'value': [{'displayName': req['url'].split('/')[4]}]}}
+            for req in json['requests']
+        ]}
+        return httpx.Response(200, json=body, request=httpx.Request('POST', url))
+
+    return fake_get, fake_post
+
+
+@patch('msal.PublicClientApplication')
+def test_get_notebooks_with_sections_batches(mock_app_class, mock_env):
+    """Test that sections for many notebooks are fetched in chunks of 20 via $batch."""
+    notebooks = [{'id': f'nb-{i}', 'displayName': f'Notebook {i}'} for i in range(25)]
+    fake_get, fake_post = _fake_graph(notebooks)
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+    with patch('httpx.AsyncClient.get', side_effect=fake_get), \
+            patch('httpx.AsyncClient.post', side_effect=fake_post) as mock_post:
+        result = auth.get_notebooks_with_sections('token-123')
+
+    assert mock_post.call_count == 2
+    assert [len(c.kwargs['json']['requests']) for c in mock_post.call_args_list] == [20, 5]
+    assert result[24]['sections'] == [{'displayName': 'nb-24'}]
+
+
+@patch('msal.PublicClientApplication')
+def test_get_notebooks_with_sections_async_inside_event_loop(mock_app_class, mock_env):
+    """Test that the async variant works where asyncio.run() would be refused."""
+    import asyncio
+
+    fake_get, fake_post = _fake_graph([{'id': 'nb-0', 'displayName': 'Work'}])
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+
+    async def ingest():
+        return await auth.get_notebooks_with_sections_async('token-123')
+
+    with patch('httpx.AsyncClient.get', side_effect=fake_get), \
+            patch('httpx.AsyncClient.post', side_effect=fake_post):
+        result = asyncio.run(ingest())
+
+    assert result == [{'id': 'nb-0', 'displayName': 'Work',
+                       'sections': [{'displayName': 'nb-0'}]}]
+
+
+def test_get_notebooks_with_sections_async_acquires_token_off_loop(cached_msal_app):
+    """Test that the async variant runs MSAL token acquisition outside the event loop."""
+    import asyncio
+    import threading
+
+    fake_get, fake_post = _fake_graph([])
+    acquired_on = []
+    real_get_access_token = OneNoteAuth.get_access_token
+
+    def recording_get_access_token(self):
+        acquired_on.append(threading.current_thread())
+        return real_get_access_token(self)
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+    with patch.object(OneNoteAuth, 'get_access_token', recording_get_access_token), \
+            patch('httpx.AsyncClient.get', side_effect=fake_get) as mock_get:
+        assert asyncio.run(auth.get_notebooks_with_sections_async()) == []
+
+    assert len(acquired_on) == 1
+    assert acquired_on[0] is not threading.main_thread()
+    mock_get.assert_called_once()
+
+
+def _batch_reply(url, json, status_for):
+    """$batch response giving each subrequest the status status_for(notebook id)."""
+    import httpx
+
+    responses = []
+    for req in json['requests']:
+        nb_id = req['url'].split('/')[4]
+        status = status_for(nb_id)
+        item = {'id': req['id'], 'status': status,
+                'body': {'value': [{'displayName': nb_id}]}}
+        if status == 429:
+            item['headers'] = {'Retry-After': '7'}
+        responses.append(item)
+    return httpx.Response(200, json={'responses': responses},
+                          request=httpx.Request('POST', url))
+
+
+@patch('msal.PublicClientApplication')
+def test_batch_resends_only_throttled_subrequests(mock_app_class, mock_env):
+    """Test that 429 subrequests are retried after Retry-After, not fatal."""
+    from unittest.mock import AsyncMock
+
+    notebooks = [{'id': f'nb-{i}', 'displayName': f'Notebook {i}'} for i in range(3)]
+    fake_get, _ = _fake_graph(notebooks)
+    throttled_once = {'nb-1'}
+
+    async def fake_post(url, json):
+        def status_for(nb_id):
+            if nb_id in throttled_once:
+                throttled_once.discard(nb_id)
+                return 429
+            return 200
+        return _batch_reply(url, json, status_for)
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+    with patch('httpx.AsyncClient.get', side_effect=fake_get), \
+            patch('httpx.AsyncClient.post', side_effect=fake_post) as mock_post, \
+            patch('asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        result = auth.get_notebooks_with_sections('token-123')
+
+    assert [len(c.kwargs['json']['requests']) for c in mock_post.call_args_list] == [3, 1]
+    mock_sleep.assert_awaited_once_with(7.0)
+    assert [nb['sections'] for nb in result] == [
+        [{'displayName': f'nb-{i}'}] for i in range(3)
+    ]
+
+
+@patch('msal.PublicClientApplication')
+def test_batch_raises_on_non_retryable_subrequest_error(mock_app_class, mock_env):
+    """Test that errors other than throttling still fail the fan-out."""
+    fake_get, _ = _fake_graph([{'id': 'nb-0', 'displayName': 'Gone'}])
+
+    async def fake_post(url, json):
+        return _batch_reply(url, json, lambda nb_id: 404)
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+    with patch('httpx.AsyncClient.get', side_effect=fake_get), \
+            patch('httpx.AsyncClient.post', side_effect=fake_post):
+        with pytest.raises(Exception, match="notebook nb-0: 404"):
+            auth.get_notebooks_with_sections('token-123')
+
+
+def test_import_does_not_load_heavy_dependencies():
+    """Test that importing auth (e.g. for --help) defers msal/requests/httpx/asyncio."""
+    import subprocess
+
+    code = (
+        "import sys, auth; "
+        "print(sorted({'msal', 'requests', 'httpx', 'asyncio'} & set(sys.modules)))"
+    )
+    out = subprocess.run(
+        [sys.executable, '-c', code], cwd=Path(__file__).parent,
+        capture_output=True, text=True, check=True,
+    )
+    assert out.stdout.strip() == '[]'
+
+
+def test_client_id_read_from_dotenv(tmp_path, monkeypatch):
+    """Test that MS_CLIENT_ID falls back to ./.env outside containers."""
+    (tmp_path / ".env").write_bytes(b"# app\nOTHER=1\nMS_CLIENT_ID='dotenv-client-id'\r\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('MS_CLIENT_ID', raising=False)
+
+    with patch('auth._IS_CONTAINER', False), \
+            patch('msal.PublicClientApplication'), \
+            patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth(token_path=str(tmp_path / "refresh_token"))
+
+    assert auth.client_id == 'dotenv-client-id'
+
+
+def test_access_token_reused_from_memory(cached_msal_app):
+    """Test that repeat calls return the in-memory token until it nears expiry."""
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+        with patch('auth.time.monotonic', return_value=1000.0):
+            assert auth.get_access_token() == 'cached-access-token'
+            assert auth.get_access_token() == 'cached-access-token'
+        cached_msal_app.acquire_token_silent.assert_called_once()
+
+        # Within the expiry margin the token is re-acquired through MSAL
+        with patch('auth.time.monotonic', return_value=1000.0 + 3600 - 30):
+            auth.get_access_token()
+        assert cached_msal_app.acquire_token_silent.call_count == 2
+
+
+def test_main_lists_notebooks(capsys):
+    """Test that the CLI prints every notebook returned by the API."""
+    mock_auth = MagicMock()
+    mock_auth.__enter__.return_value = mock_auth
+    mock_auth.get_access_token.return_value = 'a' * 30
+    mock_auth.get_notebooks.return_value = {'value': [
+        {'displayName': 'Work', 'id': 'nb-1'},
+        {'displayName': 'Home', 'id': 'nb-2'},
+    ]}
+
+    with patch.object(sys, 'argv', ['auth.py']), \
+            patch.object(auth_module, 'OneNoteAuth', return_value=mock_auth):
+        auth_module.main()
+
+    out = capsys.readouterr().out
+    assert f"{'=' * 60}\n✅ ACCESS TOKEN OBTAINED\n{'=' * 60}\n" in out
+    assert "Successfully retrieved 2 notebook(s)" in out
+    assert out.endswith("  • Work (ID: nb-1)\n  • Home (ID: nb-2)\n")
+
+
+@patch('msal.PublicClientApplication')
+def test_init_defers_app_and_token_load(mock_app_class, mock_env):
+    """Test that construction builds no MSAL app and reads no token until needed."""
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value='cached') as mock_load:
+        auth = OneNoteAuth()
+        mock_app_class.assert_not_called()
+        mock_load.assert_not_called()
+
+        assert auth.refresh_token == 'cached'
+        assert auth.refresh_token == 'cached'
+        mock_load.assert_called_once()
+
+    assert auth.app is mock_app_class.return_value
+
+
+def test_prefetch_token_used_by_next_call(cached_msal_app):
+    """Test that a prefetched token is acquired once and reused by get_access_token."""
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+        auth.prefetch_token()
+        assert auth.get_access_token() == 'cached-access-token'
+
+    cached_msal_app.acquire_token_silent.assert_called_once()
+
+
+@patch('msal.PublicClientApplication')
+def test_silent_refresh_reports_through_logging(mock_app_class, mock_env, capsys, caplog):
+    """Test that status messages go to the 'auth' logger rather than stdout."""
+    mock_app_instance = Mock()
+    mock_app_class.return_value = mock_app_instance
+    mock_app_instance.get_accounts.return_value = []
+    mock_app_instance.acquire_token_by_refresh_token.return_value = {
+        'access_token': 'new-access-token-xyz'
+    }
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value='old-cached-token'), \
+            caplog.at_level('INFO', logger='auth'):
+        OneNoteAuth().get_access_token()
+
+    assert capsys.readouterr().out == ''
+    assert "✓ Token refreshed silently" in caplog.messages
+
+
+def test_auth_header_built_once_per_token(cached_msal_app):
+    """Test that Graph calls reuse the Authorization header of the current token."""
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None), \
+            patch('requests.Session.get') as mock_get:
+        mock_get.return_value.content = b'{"value": []}'
+        auth = OneNoteAuth()
+        auth.get_notebooks()
+        auth.get_notebooks()
+
+    first, second = (c.kwargs['headers'] for c in mock_get.call_args_list)
+    assert first == {'Authorization': 'Bearer cached-access-token'}
+    assert first is second
+
+
+def test_main_auth_command_skips_api_call():
+    """Test that the 'auth' subcommand only obtains a token and honors its options."""
+    mock_auth = MagicMock()
+    mock_auth.__enter__.return_value = mock_auth
+    mock_auth.get_access_token.return_value = 'a' * 30
+
+    with patch.object(sys, 'argv', ['auth.py', 'auth', '--token-path', '/tmp/rt']), \
+            patch.object(auth_module, 'OneNoteAuth', return_value=mock_auth) as mock_cls:
+        auth_module.main()
+
+    mock_cls.assert_called_once_with(token_path='/tmp/rt', client_id=None)
+    mock_auth.get_notebooks.assert_not_called()
+
+
+def test_instances_have_no_dict(mock_env):
+    """Test that OneNoteAuth uses __slots__ and rejects unknown attributes."""
+    auth = OneNoteAuth(token_path="/dummy/path")
+    assert not hasattr(auth, '__dict__')
+    with pytest.raises(AttributeError):
+        auth.unexpected = True
+
+
+@patch('msal.PublicClientApplication')
+def test_prefetch_never_starts_device_flow(mock_app_class, mock_env):
+    """Test that a prefetch that can't refresh silently leaves the device flow to the caller."""
+    import threading
+
+    mock_app_instance = Mock()
+    mock_app_class.return_value = mock_app_instance
+    mock_app_instance.get_accounts.return_value = []
+    flow_threads = []
+    mock_app_instance.initiate_device_flow.side_effect = lambda scopes: (
+        flow_threads.append(threading.current_thread()) or {
+            'user_code': 'ABCD-EFGH',
+            'verification_uri': 'https://microsoft.com/devicelogin'
+        }
+    )
+    mock_app_instance.acquire_token_by_device_flow.return_value = {
+        'access_token': 'device-flow-access-token'
+    }
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+        auth.prefetch_token()
+        assert auth.get_access_token() == 'device-flow-access-token'
+
+    assert flow_threads == [threading.main_thread()]
+
+
+def test_prefetch_result_not_returned_after_expiry(cached_msal_app):
+    """Test that a prefetched token which has since expired is re-acquired."""
+    cached_msal_app.acquire_token_silent.side_effect = [
+        {'access_token': 'tok1', 'expires_in': 3600},
+        {'access_token': 'tok2', 'expires_in': 3600},
+    ]
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None):
+        auth = OneNoteAuth()
+        with patch('auth.time.monotonic', return_value=0.0):
+            auth.prefetch_token()
+            auth._prefetch.result()
+        with patch('auth.time.monotonic', return_value=10000.0):
+            assert auth.get_access_token() == 'tok2'
+
+
+def test_prefetch_failure_logged_and_retried(cached_msal_app, caplog):
+    """Test that a failed prefetch is logged and the silent lookup retried in the foreground."""
+    cached_msal_app.get_accounts.side_effect = [
+        RuntimeError('network down'), cached_msal_app.get_accounts.return_value
+    ]
+
+    with patch.object(OneNoteAuth, '_load_refresh_token', return_value=None), \
+            caplog.at_level('WARNING', logger='auth'):
+        auth = OneNoteAuth()
+        auth.prefetch_token()
+        assert auth.get_access_token() == 'cached-access-token'
+
+    assert "⚠ Background token prefetch failed: network down" in caplog.messages
+    cached_msal_app.initiate_device_flow.assert_not_called()
+
+
+def _add_access_token(cache, secret):
+    """Put one access token into an MSAL cache the way a token response would."""
+    cache.add({
+        'client_id': 'test-client-id',
+        'scope': ['Notes.Read'],
+        'token_endpoint': 'https://login.microsoftonline.com/common/oauth2/v2.0/token',
+        'response': {'access_token': secret, 'expires_in': 3600, 'token_type': 'Bearer'},
+    })
+
+
+def test_token_cache_lock_failure_warns_once(tmp_path, caplog):
+    """Test that an unlockable cache (e.g. read-only mount) warns once, not per access."""
+    cache = FileTokenCache(tmp_path / "cache.json")
+    with patch.object(cache._file_lock, 'acquire', side_effect=OSError('read-only')), \
+            caplog.at_level('WARNING', logger='token_store'):
+        for _ in range(5):
+            list(cache.search(cache.CredentialType.ACCESS_TOKEN))
+
+    assert len([m for m in caplog.messages if 'Could not lock' in m]) == 1
+
+
+def test_token_cache_failed_save_is_retried(tmp_path, caplog):
+    """Test that a change whose save failed is kept pending and written on a later access."""
+    path = tmp_path / "cache.json"
+    cache = FileTokenCache(path)
+    with patch('token_store.atomic_write', side_effect=OSError('disk full')), \
+            caplog.at_level('WARNING', logger='token_store'):
+        _add_access_token(cache, 'first-token')
+        _add_access_token(cache, 'second-token')
+
+    assert cache.has_state_changed
+    assert len([m for m in caplog.messages if 'Could not save' in m]) == 1
+
+    list(cache.search(cache.CredentialType.ACCESS_TOKEN))
+    other = FileTokenCache(path)
+    secrets = {t['secret'] for t in other.search(other.CredentialType.ACCESS_TOKEN)}
+    assert secrets == {'second-token'}
+
+
+def test_token_cache_reloads_rewrite_with_same_mtime(tmp_path):
+    """Test that a rewrite by another process is seen even if the mtime didn't move."""
+    path = tmp_path / "cache.json"
+    ours, theirs = FileTokenCache(path), FileTokenCache(path)
+    _add_access_token(ours, 'first-token')
+    list(theirs.search(theirs.CredentialType.ACCESS_TOKEN))
+    before = os.stat(path)
+
+    _add_access_token(ours, 'second-token')
+    # Coarse-timestamp filesystem: the rewrite keeps the old mtime
+    os.utime(path, ns=(before.st_atime_ns, before.st_mtime_ns))
+
+    secrets = {t['secret'] for t in theirs.search(theirs.CredentialType.ACCESS_TOKEN)}
+    assert 'second-token' in secrets
+
+
+def test_main_enables_only_own_logger():
+    """Test that the CLI shows auth's INFO messages without raising the root logger."""
+    import logging
+
+    mock_auth = MagicMock()
+    mock_auth.__enter__.return_value = mock_auth
+    mock_auth.get_access_token.return_value = 'a' * 30
+    root_level = logging.getLogger().level
+
+    with patch.object(sys, 'argv', ['auth.py', 'auth']), \
+            patch.object(auth_module, 'OneNoteAuth', return_value=mock_auth):
+        auth_module.main()
+
+    assert auth_module.log.getEffectiveLevel() == logging.INFO
+    assert len(auth_module.log.handlers) == 1
+    assert logging.getLogger().level == root_level
+    assert not logging.getLogger('httpx').isEnabledFor(logging.INFO)
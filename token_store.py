@@ -0,0 +1,136 @@
+import contextlib
+import logging
+import os
+from pathlib import Path
+from typing import Any, Iterator, Optional, Tuple
+
+import msal
+from filelock import FileLock
+
+log = logging.getLogger(__name__)
+
+
+def atomic_write(path: Path, data: str) -> None:
+    """Write via temp file + fsync + rename so a crash never leaves a partial file"""
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        # Buffered file object: write() keeps going until every byte is out
+        with os.fdopen(fd, "wb") as f:
+            if os.name != "nt":
+                os.fchmod(f.fileno(), 0o600)
+            f.write(data.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+class FileTokenCache(msal.SerializableTokenCache):
+    """MSAL token cache kept in sync with a file shared between processes.
+
+    MSAL for Python has no beforeCacheAccess/afterCacheAccess callbacks, so
+    (like msal-extensions' PersistedTokenCache) reads and writes are wrapped
+    here instead: every access takes a file lock and reloads the file if
+    another process changed it, and every change is written back before
+    the lock is released.
+    """
+
+    has_state_changed: bool
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = path
+        self._file_lock = FileLock(f"{path}.lock")
+        # (inode, mtime) of the file content we hold; atomic_write always
+        # swaps the inode, so this catches writes within one mtime tick
+        self._loaded_stamp: Optional[Tuple[int, int]] = None
+        self._depth = 0
+        self._dir_ready = False
+        self._lock_unavailable = False
+        # Lock/save failures (e.g. a read-only /run/secrets) are reported once
+        self._warned_unwritable = False
+
+    @contextlib.contextmanager
+    def _synced(self) -> Iterator[None]:
+        """Hold the locks, reload before and persist after the outermost change"""
+        with self._lock:
+            self._depth += 1
+            locked = self._depth == 1 and self._acquire_file_lock()
+            try:
+                if self._depth == 1:
+                    self._reload_if_changed()
+                yield
+                if self._depth == 1:
+                    self._persist()
+            finally:
+                self._depth -= 1
+                if locked:
+                    self._file_lock.release()
+
+    def _acquire_file_lock(self) -> bool:
+        """Take the file lock, degrading to in-process locking if we can't"""
+        if self._lock_unavailable:
+            return False
+        try:
+            if not self._dir_ready:
+                if not self.path.parent.exists():
+                    self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+                self._dir_ready = True
+            self._file_lock.acquire()
+            return True
+        except OSError as e:
+            # Don't retry every access
+            self._lock_unavailable = True
+            self._warn_unwritable("⚠ Could not lock token cache %s: %s", e)
+            return False
+
+    def _stamp(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_ino, st.st_mtime_ns
+
+    def _reload_if_changed(self) -> None:
+        try:
+            stamp = self._stamp()
+        except FileNotFoundError:
+            return
+        if stamp != self._loaded_stamp:
+            try:
+                self.deserialize(self.path.read_text())
+            except Exception as e:
+                log.warning("⚠ Could not load token cache from %s: %s", self.path, e)
+            self._loaded_stamp = stamp
+
+    def _persist(self) -> None:
+        if not self.has_state_changed:
+            return
+        try:
+            atomic_write(self.path, self.serialize())
+            self._loaded_stamp = self._stamp()
+        except OSError as e:
+            # serialize() cleared the flag; keep the change pending for retry
+            self.has_state_changed = True
+            self._warn_unwritable("⚠ Could not save token cache to %s: %s", e)
+
+    def _warn_unwritable(self, msg: str, error: OSError) -> None:
+        if not self._warned_unwritable:
+            log.warning(msg, self.path, error)
+            self._warned_unwritable = True
+
+    def search(self, credential_type: Any, *args: Any, **kwargs: Any) -> Any:
+        with self._synced():
+            pass
+        return super().search(credential_type, *args, **kwargs)
+
+    def add(self, event: Any, **kwargs: Any) -> None:
+        with self._synced():
+            super().add(event, **kwargs)
+
+    def modify(
+        self, credential_type: Any, old_entry: Any, new_key_value_pairs: Any = None
+    ) -> None:
+        with self._synced():
+            super().modify(credential_type, old_entry, new_key_value_pairs)